@@ -7,8 +7,13 @@ btc_eth_bark_notifier.py
 或 BTC/ETH 比率达到24h/72h/144h新高/新低时，
 立刻通过 Bark 推送到 iPhone。
 
+价格来源：
+    Binance WebSocket 行情推送（btcusdt/ethusdt miniTicker），
+    长连接后台接收，省掉每次轮询的 TCP/TLS/HTTP 开销，也不受
+    CoinGecko 限流影响；WebSocket 未就绪时退回 CoinGecko REST 接口。
+
 依赖：
-    pip install requests
+    pip install requests websocket-client
 环境变量（也可以直接写在脚本里）：
     BARK_KEY   —— 必填，Bark Device Key
     BARK_BASE  —— 选填，Bark 服务器根地址，默认 https://api.day.app
@@ -22,11 +27,23 @@ btc_eth_bark_notifier.py
 """
 import os
 import sys
+import json
 import time
+import queue
 import sqlite3
+import threading
 import requests
+import websocket
+from requests.adapters import HTTPAdapter, Retry
+from collections import deque
 from urllib.parse import quote
-from datetime import datetime, timedelta
+from datetime import datetime
+
+try:
+    # 可选加速：启动时向量化重建窗口（高频采样下历史可达数十万行）
+    import numpy as np
+except ImportError:
+    np = None
 
 # ==== 配置（可用环境变量覆盖） ====
 BARK_KEY   = os.getenv("BARK_KEY",  "YOUR_DEVICE_KEY")
@@ -42,15 +59,35 @@ COINGECKO_URL = (
     "?ids=bitcoin,ethereum&vs_currencies=usd"
 )
 
+BINANCE_WS_URL = (
+    "wss://stream.binance.com:9443/stream"
+    "?streams=btcusdt@miniTicker/ethusdt@miniTicker"
+)
+
+# 复用 HTTP 连接（keep-alive），省掉每次请求的 TCP/TLS 握手；
+# Retry 对瞬时网关错误自动按退避重试（429 限流在 fetch_prices 里
+# 做应用层自适应退避，不在这里重试，否则拿不到状态码）
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=2,
+    pool_maxsize=4,
+    max_retries=Retry(total=3, backoff_factor=1,
+                      status_forcelist=[502, 503]),
+))
+
 # ==== 推送 ====
-def bark_push(title: str, body: str):
+# Bark 请求走后台线程：慢的 Bark 服务器（最长 8s 超时）不再阻塞
+# 行情检查，缩小错过阈值穿越的窗口
+_bark_q: queue.Queue[tuple[str, str]] = queue.Queue()
+
+def _bark_send(title: str, body: str):
     # URL-encode title and body to handle special characters like "/"
     # Use safe='' to encode ALL characters including "/"
     encoded_title = quote(title, safe='')
     encoded_body = quote(body, safe='')
     url = f"{BARK_BASE}/{BARK_KEY}/{encoded_title}/{encoded_body}"
     try:
-        r = requests.get(url, timeout=8)
+        r = SESSION.get(url, timeout=8)
         if r.status_code != 200:
             print(f"[BARK ERROR] {r.status_code} {r.text}")
             return
@@ -58,17 +95,150 @@ def bark_push(title: str, body: str):
     except requests.RequestException as e:
         print(f"[BARK ERROR] {e}")
 
+def _bark_worker():
+    while True:
+        title, body = _bark_q.get()
+        _bark_send(title, body)
+        _bark_q.task_done()
+
+def bark_push(title: str, body: str):
+    """把通知交给后台线程发送，调用方立即返回"""
+    _bark_q.put((title, body))
+
+def start_bark_worker():
+    threading.Thread(target=_bark_worker, daemon=True).start()
+
 # ==== 取价 ====
-def fetch_prices() -> tuple[float, float]:
-    r = requests.get(COINGECKO_URL, timeout=8)
+# CoinGecko 限流退避状态（仅 REST 后备路径使用）
+_cg_consecutive_429 = 0
+_cg_next_allowed = 0.0   # 该时间点之前不再发 REST 请求
+
+def fetch_prices() -> tuple[float, float] | None:
+    """CoinGecko REST 取价（WebSocket 未就绪时的后备手段）。
+    命中 429 时优先按 Retry-After、否则按指数退避静默一段时间，
+    期间直接返回 None——被限流后每个周期照常去撞接口只会招来
+    更多 429 甚至封 IP"""
+    global _cg_consecutive_429, _cg_next_allowed
+    if time.time() < _cg_next_allowed:
+        return None
+    try:
+        r = SESSION.get(COINGECKO_URL, timeout=8)
+    except requests.RequestException as e:
+        print(f"[CG ERROR] {e}")
+        return None
+    if r.status_code == 429:
+        retry_after = r.headers.get("Retry-After")
+        if retry_after is not None:
+            delay = float(retry_after)
+        else:
+            delay = min(60 * 2 ** _cg_consecutive_429, 600)
+        _cg_consecutive_429 += 1
+        _cg_next_allowed = time.time() + delay
+        print(f"[CG] 限流(429)，{delay:.0f}s 内暂停 REST 取价")
+        return None
+    if r.status_code != 200:
+        print(f"[CG ERROR] {r.status_code} {r.text}")
+        return None
+    _cg_consecutive_429 = 0
     data = r.json()
     return data["bitcoin"]["usd"], data["ethereum"]["usd"]
 
+# ==== 行情推送（WebSocket） ====
+class PriceFeed:
+    """订阅 Binance miniTicker 推送，后台线程持续更新最新 BTC/ETH 价格。
+    断线后按指数退避自动重连。"""
+
+    def __init__(self, url: str = BINANCE_WS_URL):
+        self.url = url
+        self._lock = threading.Lock()
+        self._latest_btc: float | None = None
+        self._latest_eth: float | None = None
+        self._thread = threading.Thread(target=self._run_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def get_prices(self) -> tuple[float, float] | None:
+        """返回最新 (btc_price, eth_price)；两个价格还没都收到过时返回 None"""
+        with self._lock:
+            if self._latest_btc is None or self._latest_eth is None:
+                return None
+            return self._latest_btc, self._latest_eth
+
+    def _on_message(self, ws, message):
+        payload = json.loads(message)
+        stream = payload.get("stream", "")
+        price = float(payload["data"]["c"])  # miniTicker 的最新收盘价字段
+        with self._lock:
+            if stream.startswith("btcusdt"):
+                self._latest_btc = price
+            elif stream.startswith("ethusdt"):
+                self._latest_eth = price
+
+    def _run_forever(self):
+        backoff = 1
+        while True:
+            connected_at = time.time()
+            ws = websocket.WebSocketApp(self.url, on_message=self._on_message)
+            try:
+                ws.run_forever(ping_interval=180, ping_timeout=10)
+            except Exception as e:
+                print(f"[WS ERROR] {e}")
+            # 连接维持超过一分钟视为曾经正常，重置退避
+            if time.time() - connected_at > 60:
+                backoff = 1
+            print(f"[WS] 连接断开，{backoff}s 后重连")
+            sys.stdout.flush()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+def current_prices(feed: PriceFeed) -> tuple[float, float] | None:
+    """优先读 WebSocket 推送的最新价格；未就绪时退回 REST 轮询。
+    两条路都不可用（REST 正在退避）时返回 None"""
+    prices = feed.get_prices()
+    if prices is not None:
+        return prices
+    return fetch_prices()
+
 # ==== 历史价格追踪（SQLite持久化） ====
+# sqlite3 按语句文本缓存 prepared statement——同一个字符串对象反复
+# execute 就不用重新解析 SQL，所以热路径语句统一定义成模块级常量
+_SQL_INSERT_PRICE = (
+    'INSERT INTO price_history (timestamp, btc_price, eth_price, ratio) VALUES (?, ?, ?, ?)'
+)
+_SQL_DELETE_EXPIRED = 'DELETE FROM price_history WHERE timestamp < ?'
+_SQL_MIN_TIMESTAMP = 'SELECT MIN(timestamp) FROM price_history'
+_SQL_COUNT_ROWS = 'SELECT COUNT(*) FROM price_history'
+_SQL_SELECT_HISTORY = 'SELECT timestamp, ratio FROM price_history ORDER BY timestamp'
+_SQL_LOAD_LAST_ALERTED = 'SELECT key, value FROM last_alerted'
+_SQL_SAVE_LAST_ALERTED = 'INSERT OR REPLACE INTO last_alerted (key, value) VALUES (?, ?)'
+
 class PriceTracker:
+    # Periods sorted from longest to shortest
+    PERIODS = (
+        ("144h", 144),
+        ("72h", 72),
+        ("24h", 24),
+    )
+
     def __init__(self, db_path: str = DB_PATH):
         self.db_path = db_path
+        # Single long-lived connection: reopening per call pays page-cache
+        # warmup and schema parsing cost on every poll
+        self.conn = self._connect()
         self._init_db()
+        # Poll counter; old-row cleanup runs only every CLEANUP_EVERY polls
+        self._tick = 0
+        # Monotonic deques per period (sliding-window minimum algorithm):
+        # the window min/max is always the front element, updated in
+        # amortized O(1) per sample — SQLite is durability only, not a
+        # query path in the hot loop
+        self._min_dq: dict[str, deque] = {name: deque() for name, _ in self.PERIODS}
+        self._max_dq: dict[str, deque] = {name: deque() for name, _ in self.PERIODS}
+        self._rebuild_windows()
+        # The oldest timestamp only changes on first insert or cleanup,
+        # so cache it instead of running MIN() every tick
+        self._oldest_ts = self._get_oldest_timestamp()
         # Track last alerted extremes to avoid duplicate alerts
         self.last_alerted = {
             "24h_low": None,
@@ -79,25 +249,64 @@ class PriceTracker:
             "144h_high": None,
         }
         self._load_last_alerted()
-    
+        # DB writes happen on a background thread so the alert path never
+        # blocks on a commit; the lock keeps its batched transactions from
+        # interleaving with writes issued by the main thread
+        self._db_lock = threading.Lock()
+        self._write_q: queue.Queue[tuple[int, float, float, float]] = queue.Queue()
+        threading.Thread(target=self._writer_loop, daemon=True).start()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with performance PRAGMAs applied.
+        WAL + synchronous=NORMAL avoids a full fsync per commit and lets
+        reads run concurrently with writes."""
+        # isolation_level=None: autocommit, transactions managed explicitly
+        # with BEGIN IMMEDIATE ... COMMIT where batching matters
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               isolation_level=None)
+        conn.executescript('''
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA busy_timeout=5000;
+            PRAGMA cache_size=-20000;
+            PRAGMA temp_store=memory;
+        ''')
+        return conn
+
     def _init_db(self):
         """Initialize SQLite database and create tables if needed"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        # Table for price history (BTC, ETH, and ratio)
+        cursor = self.conn.cursor()
+        # Two legacy shapes get rebuilt in place: timestamps stored as
+        # ISO-8601 TEXT (~26 bytes per row, string comparisons, parsing
+        # on every read), and an id AUTOINCREMENT column — nothing ever
+        # read id, and AUTOINCREMENT forces SQLite to update a
+        # sqlite_sequence row on every single INSERT
+        cursor.execute('''
+            SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'price_history'
+        ''')
+        row = cursor.fetchone()
+        table_sql = row[0] if row else ''
+        legacy_text_ts = 'timestamp TEXT' in table_sql
+        needs_migration = legacy_text_ts or 'AUTOINCREMENT' in table_sql
+        if needs_migration:
+            cursor.execute('ALTER TABLE price_history RENAME TO price_history_legacy')
+            cursor.execute('DROP INDEX IF EXISTS idx_price_ts_ratio')
+        # Table for price history (BTC, ETH, and ratio); timestamp is
+        # integer unix epoch seconds, the implicit rowid is the key
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS price_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
+                timestamp INTEGER NOT NULL,
                 btc_price REAL NOT NULL,
                 eth_price REAL NOT NULL,
                 ratio REAL NOT NULL
             )
         ''')
-        # Index for faster timestamp queries
+        # Covering index: range MIN/MAX on ratio is answered entirely from
+        # the index without touching table rows
         cursor.execute('''
-            CREATE INDEX IF NOT EXISTS idx_price_timestamp ON price_history(timestamp)
+            CREATE INDEX IF NOT EXISTS idx_price_ts_ratio ON price_history(timestamp, ratio)
         ''')
+        cursor.execute('DROP INDEX IF EXISTS idx_price_timestamp')
         # Table for last alerted values (persisted across restarts)
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS last_alerted (
@@ -105,69 +314,160 @@ class PriceTracker:
                 value REAL
             )
         ''')
-        conn.commit()
-        conn.close()
-    
+        if needs_migration:
+            cursor.execute('''
+                SELECT timestamp, btc_price, eth_price, ratio FROM price_history_legacy
+            ''')
+            rows = cursor.fetchall()
+            if legacy_text_ts:
+                rows = [(int(datetime.fromisoformat(ts).timestamp()), btc, eth, ratio)
+                        for ts, btc, eth, ratio in rows]
+            cursor.executemany('''
+                INSERT INTO price_history (timestamp, btc_price, eth_price, ratio) VALUES (?, ?, ?, ?)
+            ''', rows)
+            cursor.execute('DROP TABLE price_history_legacy')
+            print(f"[DB] 旧表结构迁移完成: {len(rows)}条记录")
+
     def _load_last_alerted(self):
         """Load last alerted values from database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT key, value FROM last_alerted')
+        cursor = self.conn.cursor()
+        cursor.execute(_SQL_LOAD_LAST_ALERTED)
         for key, value in cursor.fetchall():
             if key in self.last_alerted:
                 self.last_alerted[key] = value
-        conn.close()
-    
+
     def _save_last_alerted(self, key: str, value: float):
         """Save last alerted value to database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT OR REPLACE INTO last_alerted (key, value) VALUES (?, ?)
-        ''', (key, value))
-        conn.commit()
-        conn.close()
-    
-    def add_prices(self, btc_price: float, eth_price: float, ratio: float):
-        """Add new price measurements with current timestamp"""
-        now = datetime.now()
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Insert new prices and ratio
-        cursor.execute('''
-            INSERT INTO price_history (timestamp, btc_price, eth_price, ratio) VALUES (?, ?, ?, ?)
-        ''', (now.isoformat(), btc_price, eth_price, ratio))
-        
-        # Clean up old data (keep only last 145 hours)
-        cutoff = (now - timedelta(hours=145)).isoformat()
-        cursor.execute('DELETE FROM price_history WHERE timestamp < ?', (cutoff,))
-        
-        conn.commit()
-        conn.close()
-    
-    def _get_oldest_timestamp(self) -> datetime | None:
-        """Get the oldest timestamp in the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT MIN(timestamp) FROM price_history')
-        result = cursor.fetchone()[0]
-        conn.close()
-        if result:
-            return datetime.fromisoformat(result)
-        return None
-    
-    def _get_period_ratios(self, hours: int) -> list[float]:
-        """Get all ratios within the specified period"""
-        cutoff = (datetime.now() - timedelta(hours=hours)).isoformat()
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT ratio FROM price_history WHERE timestamp >= ?
-        ''', (cutoff,))
-        ratios = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return ratios
+        with self._db_lock:
+            cursor = self.conn.cursor()
+            cursor.execute(_SQL_SAVE_LAST_ALERTED, (key, value))
+
+    # 每 120 次轮询（默认间隔下约一小时）才清理一次过期数据
+    CLEANUP_EVERY = 120
+    # 写线程单个事务最多合并的样本数
+    WRITE_BATCH_MAX = 50
+
+    def add_prices(self, btc_price: float, eth_price: float, ratio: float, now: int):
+        """Add new price measurements stamped with the caller's clock.
+        Non-blocking: the sample goes onto the writer queue and the
+        in-memory window state is updated immediately, so the alert path
+        never waits on a COMMIT fsync."""
+        if self._oldest_ts is None:
+            self._oldest_ts = now
+        self._push_window_sample(now, ratio)
+
+        self._write_q.put_nowait((now, btc_price, eth_price, ratio))
+
+    def _writer_loop(self):
+        """Daemon thread: drain queued samples and commit them in batches"""
+        cursor = self.conn.cursor()
+        while True:
+            batch = [self._write_q.get()]
+            # Fold any samples already queued into the same transaction
+            while len(batch) < self.WRITE_BATCH_MAX:
+                try:
+                    batch.append(self._write_q.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                with self._db_lock:
+                    # BEGIN IMMEDIATE groups the batch (plus any cleanup)
+                    # into one commit and takes the write lock up front,
+                    # avoiding SQLITE_BUSY
+                    cursor.execute('BEGIN IMMEDIATE')
+                    cursor.executemany(_SQL_INSERT_PRICE, batch)
+
+                    # Clean up old data (keep only last 145 hours) —
+                    # scanning for expired rows on every batch is wasted
+                    # work, so do it roughly hourly
+                    self._tick += len(batch)
+                    cleaned_up = False
+                    if self._tick >= self.CLEANUP_EVERY:
+                        self._tick = 0
+                        cursor.execute(_SQL_DELETE_EXPIRED, (batch[-1][0] - 145 * 3600,))
+                        cleaned_up = True
+
+                    cursor.execute('COMMIT')
+
+                # Refresh the cached oldest timestamp only when it moved
+                if cleaned_up:
+                    self._oldest_ts = self._get_oldest_timestamp()
+            except sqlite3.Error as e:
+                print(f"[DB ERROR] {e}")
+                try:
+                    cursor.execute('ROLLBACK')
+                except sqlite3.Error:
+                    pass
+            finally:
+                for _ in batch:
+                    self._write_q.task_done()
+
+    def _get_oldest_timestamp(self) -> int | None:
+        """Get the oldest timestamp (epoch seconds) in the database"""
+        cursor = self.conn.cursor()
+        cursor.execute(_SQL_MIN_TIMESTAMP)
+        return cursor.fetchone()[0]
+
+    def _push_window_sample(self, now: int, ratio: float):
+        """Feed one (timestamp, ratio) sample into the per-period monotonic
+        deques and evict entries that fell out of each window."""
+        for period_name, hours in self.PERIODS:
+            cutoff = now - hours * 3600
+
+            min_dq = self._min_dq[period_name]
+            while min_dq and min_dq[-1][1] >= ratio:
+                min_dq.pop()
+            min_dq.append((now, ratio))
+            while min_dq[0][0] < cutoff:
+                min_dq.popleft()
+
+            max_dq = self._max_dq[period_name]
+            while max_dq and max_dq[-1][1] <= ratio:
+                max_dq.pop()
+            max_dq.append((now, ratio))
+            while max_dq[0][0] < cutoff:
+                max_dq.popleft()
+
+    def _rebuild_windows(self):
+        """Rebuild the monotonic deques from persisted history on startup.
+        Iterates the cursor directly — no point materializing up to 145h
+        of rows as a Python list just to walk it once."""
+        cursor = self.conn.cursor()
+        cursor.execute(_SQL_SELECT_HISTORY)
+        if np is not None:
+            self._rebuild_windows_vectorized(cursor)
+            return
+        for ts, ratio in cursor:
+            self._push_window_sample(ts, ratio)
+
+    def _rebuild_windows_vectorized(self, cursor):
+        """NumPy 路径：最终的 min 单调队列恰好是「严格后缀最小」样本
+        （ratio 比其后所有样本都小），max 队列同理——用一次累积归约
+        直接算出队列内容，替代逐行 Python 循环；秒级采样下 144h 的
+        几十万行重建从解释执行变成几趟 C 层扫描"""
+        data = np.fromiter(cursor, dtype=np.dtype([("ts", np.int64), ("ratio", np.float64)]))
+        if data.size == 0:
+            return
+        ts = data["ts"]
+        ratios = data["ratio"]
+        last_ts = int(ts[-1])
+
+        # suffix_min[i] = min(ratios[i:])，反转后累积归约再反转
+        suffix_min = np.minimum.accumulate(ratios[::-1])[::-1]
+        suffix_max = np.maximum.accumulate(ratios[::-1])[::-1]
+        keep_min = np.empty(data.size, dtype=bool)
+        keep_max = np.empty(data.size, dtype=bool)
+        keep_min[-1] = keep_max[-1] = True   # 最新样本恒在队列里
+        keep_min[:-1] = ratios[:-1] < suffix_min[1:]
+        keep_max[:-1] = ratios[:-1] > suffix_max[1:]
+
+        for period_name, hours in self.PERIODS:
+            in_window = ts >= last_ts - hours * 3600
+            for dq, keep in ((self._min_dq[period_name], keep_min),
+                             (self._max_dq[period_name], keep_max)):
+                sel = keep & in_window
+                dq.extend(zip(ts[sel].tolist(), ratios[sel].tolist()))
     
     def _get_shorter_period_keys(self, period_name: str, extreme_type: str) -> list[str]:
         """Get all shorter period keys for a given period and extreme type.
@@ -180,41 +480,46 @@ class PriceTracker:
                 shorter_keys.append(f"{pname}_{extreme_type}")
         return shorter_keys
     
-    def check_extremes(self, current_ratio: float) -> list[tuple[str, str]]:
+    def check_extremes(self, current_ratio: float, now: int) -> list[tuple[str, str]]:
         """Check if current ratio is a new low/high for any period.
+        Takes the same `now` the caller stamped on add_prices, so the
+        just-inserted sample is inside every window it checks.
         Returns list of alert messages (only longest period for each extreme type).
         Also updates all shorter period extremes to prevent duplicate alerts."""
-        now = datetime.now()
-        oldest_timestamp = self._get_oldest_timestamp()
-        
+        oldest_timestamp = self._oldest_ts
+
         if not oldest_timestamp:
             return []
-        
-        data_span_hours = (now - oldest_timestamp).total_seconds() / 3600
-        
-        # Periods sorted from longest to shortest
-        periods = [
-            ("144h", 144),
-            ("72h", 72),
-            ("24h", 24)
-        ]
-        
+
+        # Fast path: the 24h window is the tightest, so a ratio strictly
+        # inside its extremes cannot be a new low/high for any period —
+        # the common case degenerates to two float comparisons
+        min_dq_24h = self._min_dq["24h"]
+        max_dq_24h = self._max_dq["24h"]
+        if (min_dq_24h and max_dq_24h
+                and min_dq_24h[0][1] < current_ratio < max_dq_24h[0][1]):
+            return []
+
+        data_span_hours = (now - oldest_timestamp) / 3600
+
         # Track the longest period extreme for each type
         longest_low = None   # (period_name, hours, current_ratio, low_key)
         longest_high = None  # (period_name, hours, current_ratio, high_key)
-        
-        for period_name, hours in periods:
+
+        for period_name, hours in self.PERIODS:
             # Skip if we don't have enough historical data
             if data_span_hours < hours:
                 continue
-            
-            period_ratios = self._get_period_ratios(hours)
-            if not period_ratios:
+
+            min_dq = self._min_dq[period_name]
+            max_dq = self._max_dq[period_name]
+            if not min_dq or not max_dq:
                 continue
-            
-            min_ratio = min(period_ratios)
-            max_ratio = max(period_ratios)
-            
+
+            # Window extremes sit at the deque fronts — O(1) reads
+            min_ratio = min_dq[0][1]
+            max_ratio = max_dq[0][1]
+
             # Check for new low (only if we haven't found a longer period low yet)
             if longest_low is None and current_ratio <= min_ratio:
                 low_key = f"{period_name}_low"
@@ -264,20 +569,53 @@ class PriceTracker:
     
     def get_data_info(self) -> str:
         """Get info about stored data for display"""
-        oldest = self._get_oldest_timestamp()
+        oldest = self._oldest_ts
         if not oldest:
             return "无历史数据"
-        data_span = (datetime.now() - oldest).total_seconds() / 3600
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) FROM price_history')
+        data_span = (int(time.time()) - oldest) / 3600
+        cursor = self.conn.cursor()
+        cursor.execute(_SQL_COUNT_ROWS)
         count = cursor.fetchone()[0]
-        conn.close()
         return f"历史数据: {count}条记录, 跨度{data_span:.1f}小时"
 
 # ==== 主逻辑 ====
+def _fmt_usd(value: float) -> str:
+    return f"${value:,.0f}"
+
+def _fmt_ratio(value: float) -> str:
+    return f"{value:.2f}"
+
+def _fmt_ratio_slot(value: float) -> str:
+    return f"{value:.1f}"
+
+def emit_slot_alert(symbol: str, old_slot: int, new_slot: int, step: float,
+                    value: float, fmt_value, fmt_thresh, noun: str = "现价"):
+    """某个整数档位被跨越：推送 Bark 并打日志。
+    上穿到达的是新档位下沿，下穿到达的是上一档位下沿，统一写成
+    (new_slot + (not up)) * step，无需分支"""
+    up = new_slot > old_slot
+    direction = "上升至" if up else "下降至"
+    final_threshold = (new_slot + (not up)) * step
+    # 数字转字符串只做一次，推送和日志共用同一份结果
+    thresh_str = fmt_thresh(final_threshold)
+    value_str = fmt_value(value)
+    bark_push(
+        f"{symbol} {direction} {thresh_str}",
+        f"{noun} ≈ {value_str}"
+    )
+    print(f"[{symbol}] {direction} {thresh_str} {noun} ≈ {value_str}")
+    # Flush stdout
+    sys.stdout.flush()
+
 def main():
-    btc_price, eth_price = fetch_prices()
+    start_bark_worker()
+    feed = PriceFeed()
+    feed.start()
+    prices = current_prices(feed)
+    while prices is None:
+        time.sleep(5)
+        prices = current_prices(feed)
+    btc_price, eth_price = prices
     btc_slot = int(btc_price // BTC_STEP)  # 当前 BTC 所在整数档
     eth_slot = int(eth_price // ETH_STEP)  # 当前 ETH 所在整数档
     ratio = btc_price / eth_price           # BTC/ETH 比率
@@ -294,7 +632,12 @@ def main():
 
     while True:
         try:
-            btc_price, eth_price = fetch_prices()
+            prices = current_prices(feed)
+            if prices is None:
+                # 行情不可用（WS 未就绪且 REST 在退避），等下个周期
+                time.sleep(INTERVAL)
+                continue
+            btc_price, eth_price = prices
             new_btc_slot = int(btc_price // BTC_STEP)
             new_eth_slot = int(eth_price // ETH_STEP)
             ratio = btc_price / eth_price
@@ -302,46 +645,26 @@ def main():
 
             # 如果跨过一个或多个 BTC 档位
             if new_btc_slot != btc_slot:
-                direction = "上升至" if new_btc_slot > btc_slot else "下降至"
-                final_threshold = new_btc_slot * BTC_STEP if new_btc_slot > btc_slot else (new_btc_slot + 1) * BTC_STEP
-                bark_push(
-                    f"BTC {direction} ${final_threshold:,.0f}",
-                    f"现价 ≈ ${btc_price:,.0f}"
-                )
-                print(f"[BTC] {direction} ${final_threshold:,.0f} 现价 ≈ ${btc_price:,.0f}")
-                # Flush stdout
-                sys.stdout.flush()
+                emit_slot_alert("BTC", btc_slot, new_btc_slot, BTC_STEP,
+                                btc_price, _fmt_usd, _fmt_usd)
                 btc_slot = new_btc_slot
 
             # 如果跨过一个或多个 ETH 档位
             if new_eth_slot != eth_slot:
-                direction = "上升至" if new_eth_slot > eth_slot else "下降至"
-                final_threshold = new_eth_slot * ETH_STEP if new_eth_slot > eth_slot else (new_eth_slot + 1) * ETH_STEP
-                bark_push(
-                    f"ETH {direction} ${final_threshold:,.0f}",
-                    f"现价 ≈ ${eth_price:,.0f}"
-                )
-                print(f"[ETH] {direction} ${final_threshold:,.0f} 现价 ≈ ${eth_price:,.0f}")
-                # Flush stdout
-                sys.stdout.flush()
+                emit_slot_alert("ETH", eth_slot, new_eth_slot, ETH_STEP,
+                                eth_price, _fmt_usd, _fmt_usd)
                 eth_slot = new_eth_slot
 
             # 如果跨过一个或多个 BTC/ETH 比率档位
             if new_ratio_slot != ratio_slot:
-                direction = "上升至" if new_ratio_slot > ratio_slot else "下降至"
-                final_ratio = new_ratio_slot * RATIO_STEP if new_ratio_slot > ratio_slot else (new_ratio_slot + 1) * RATIO_STEP
-                bark_push(
-                    f"BTC/ETH {direction} {final_ratio:.1f}",
-                    f"现值 ≈ {ratio:.2f}"
-                )
-                print(f"[BTC/ETH] {direction} {final_ratio:.1f} 现值 ≈ {ratio:.2f}")
-                # Flush stdout
-                sys.stdout.flush()
+                emit_slot_alert("BTC/ETH", ratio_slot, new_ratio_slot, RATIO_STEP,
+                                ratio, _fmt_ratio, _fmt_ratio_slot, noun="现值")
                 ratio_slot = new_ratio_slot
-            
-            # 追踪价格历史并检查24h/72h/144h极值
-            tracker.add_prices(btc_price, eth_price, ratio)
-            extreme_alerts = tracker.check_extremes(ratio)
+
+            # 追踪价格历史并检查24h/72h/144h极值（同一时间戳）
+            now = int(time.time())
+            tracker.add_prices(btc_price, eth_price, ratio, now)
+            extreme_alerts = tracker.check_extremes(ratio, now)
             for title, body in extreme_alerts:
                 bark_push(title, body)
                 print(f"[EXTREME] {title} {body}")